@@ -0,0 +1,78 @@
+using System.Collections.Generic;
+using osu.Game.Beatmaps;
+using osu.Game.Rulesets.Catch.Objects;
+using osu.Game.Rulesets.Scoring;
+using osu.Game.Scoring;
+
+namespace OsuTools
+{
+    /// <summary>
+    /// 供 Python 端调用的批量计算辅助方法，把逐物件的循环留在托管代码内完成，
+    /// 每张谱面只需一次 pythonnet 调用。
+    /// </summary>
+    public static class Helpers
+    {
+        /// <summary>
+        /// 统计 Catch 谱面的物件数量。
+        /// </summary>
+        /// <returns>(水果数, 全部 Droplet 数 (含 TinyDroplet), TinyDroplet 数)</returns>
+        public static (int, int, int) ComputeCatchMaxCombo(IBeatmap beatmap)
+        {
+            int fruits = 0;
+            int droplets = 0;
+            int tinyDroplets = 0;
+
+            foreach (var h in beatmap.HitObjects)
+            {
+                switch (h)
+                {
+                    case Fruit:
+                        fruits++;
+                        break;
+
+                    case JuiceStream:
+                        foreach (var n in h.NestedHitObjects)
+                        {
+                            switch (n)
+                            {
+                                case TinyDroplet:
+                                    tinyDroplets++;
+                                    droplets++;
+                                    break;
+
+                                case Droplet:
+                                    droplets++;
+                                    break;
+
+                                case Fruit:
+                                    fruits++;
+                                    break;
+                            }
+                        }
+
+                        break;
+                }
+            }
+
+            return (fruits, droplets, tinyDroplets);
+        }
+
+        /// <summary>
+        /// 一次性填充 ScoreInfo.Statistics，忽略数量不大于 0 的判定。
+        /// </summary>
+        /// <param name="results">HitResult 的整数值</param>
+        /// <param name="counts">与 results 一一对应的数量</param>
+        public static void SetStatistics(ScoreInfo score, int[] results, int[] counts)
+        {
+            var statistics = new Dictionary<HitResult, int>(results.Length);
+
+            for (int i = 0; i < results.Length; i++)
+            {
+                if (counts[i] > 0)
+                    statistics[(HitResult)results[i]] = counts[i];
+            }
+
+            score.Statistics = statistics;
+        }
+    }
+}
@@ -1,12 +1,29 @@
 import sys
 import os
-import math
+import bisect
+import ctypes
+import types
+import logging
 import warnings
 import subprocess
 import shutil
+import stat
+import threading
+import time
+import traceback
 from pathlib import Path
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
-from typing import List, Dict, Union, Optional, Any, Type
+from typing import List, Dict, Tuple, Union, Optional, Any, Type, Iterator
+
+try:
+    import numpy as np
+except ImportError:  # 可选依赖 (pip install osu-tools-py[numpy])，仅用于批量模拟
+    np = None
+
+logger = logging.getLogger(__name__)
 
 
 # ================= 数据结构定义 =================
@@ -32,15 +49,78 @@ class CalculationResult:
         return self.error is None
 
 
+class _LruCache:
+    """基于 OrderedDict 的简单 LRU 缓存，用于保存 C# 对象 (无法交给 functools.lru_cache)。加锁以便 calculate_many 多线程共享"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Any, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Any) -> Any:
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key: Any, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+@dataclass
+class _BeatmapContext:
+    """calculate_batch 中各成绩共用的谱面与计算器"""
+    abs_path: str
+    mtime: int
+    mode: int
+    ruleset: Any
+    beatmap: Any
+    working_beatmap: Any
+    original_ruleset_id: int
+    # 首次需要时创建，同一批次内依次复用
+    diff_calc: Any = None
+
+
 # ================= 库配置与初始化 =================
 
+# dotnet 检查结果的磁盘缓存，有效期内新进程不再启动 dotnet 子进程
+_DOTNET_CHECK_CACHE = Path("~/.cache/osu_lib/dotnet_ok")
+_DOTNET_CHECK_TTL = 7 * 24 * 3600
+# 该环境变量为 1/true/yes 时跳过 dotnet 检查 (如进程池 worker)
+_SKIP_DOTNET_CHECK_ENV = "OSU_LIB_SKIP_DOTNET_CHECK"
+# 设置该环境变量后，计算失败时额外把堆栈打印到 stderr
+_DEBUG_ENV = "OSU_LIB_DEBUG"
+
+
 class OsuEnvironment:
     """管理 .NET 运行时和 DLL 加载的单例类"""
     _initialized: bool = False
+    # dotnet 运行时检查只需成功一次 (setup 失败重试时不再重复启动子进程)
+    _dotnet_checked: bool = False
+    # 全进程共享的 C# 类型句柄，setup 完成后可用
+    clr_types: Optional["_ClrTypes"] = None
 
     @classmethod
     def _check_dotnet_installed(cls) -> None:
-        """检查系统是否安装了 .NET 8 Runtime"""
+        """检查系统是否安装了 .NET 8 Runtime (近期检查通过时只确认 dotnet 命令仍存在)"""
+        dotnet_cmd = cls._find_dotnet()
+        if cls._dotnet_check_cached():
+            return
+        cls._check_dotnet_runtime(dotnet_cmd)
+        cls._mark_dotnet_checked()
+
+    @classmethod
+    def _find_dotnet(cls) -> str:
+        """定位 dotnet 命令，找不到时给出安装提示"""
 
         # 1. 检查 dotnet 命令
         # shutil.which 在 Python < 3.12 的 Windows 上不支持 Path 对象，强制转 str
@@ -56,6 +136,11 @@ class OsuEnvironment:
                     cls._raise_dotnet_error()
             else:
                 cls._raise_dotnet_error()
+        return dotnet_cmd
+
+    @staticmethod
+    def _check_dotnet_runtime(dotnet_cmd: str) -> None:
+        """通过 `dotnet --list-runtimes` 确认已安装 .NET 8 Runtime"""
 
         # 2. 检查 Runtime 版本
         try:
@@ -82,6 +167,25 @@ class OsuEnvironment:
         except (subprocess.CalledProcessError, FileNotFoundError):
             raise RuntimeError("无法执行 dotnet 命令，请检查 .NET 8 是否正确安装。")
 
+    @staticmethod
+    def _dotnet_check_cached() -> bool:
+        """近期是否已有进程检查通过 (缓存文件存在且未过期)"""
+        try:
+            mtime = _DOTNET_CHECK_CACHE.expanduser().stat().st_mtime
+        except (OSError, RuntimeError):
+            return False
+        return time.time() - mtime < _DOTNET_CHECK_TTL
+
+    @staticmethod
+    def _mark_dotnet_checked() -> None:
+        """记录检查通过，缓存目录不可写时忽略"""
+        try:
+            cache_file = _DOTNET_CHECK_CACHE.expanduser()
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            cache_file.touch()
+        except (OSError, RuntimeError):
+            logger.debug("cannot write dotnet check cache", exc_info=True)
+
     @staticmethod
     def _raise_dotnet_error():
         raise RuntimeError(
@@ -90,10 +194,20 @@ class OsuEnvironment:
         )
 
     @classmethod
-    def setup(cls) -> None:
+    def setup(cls, skip_env_check: bool = False) -> None:
+        """
+        配置 .NET 运行时并加载 DLL。
+        :param skip_env_check: 跳过 `dotnet --list-runtimes` 检查 (调用方已确认环境可用时使用)，
+                               也可设置环境变量 OSU_LIB_SKIP_DOTNET_CHECK
+        """
         if cls._initialized: return
 
-        cls._check_dotnet_installed()
+        if os.environ.get(_SKIP_DOTNET_CHECK_ENV, "").strip().lower() in ("1", "true", "yes"):
+            skip_env_check = True
+
+        if not skip_env_check and not cls._dotnet_checked:
+            cls._check_dotnet_installed()
+            cls._dotnet_checked = True
 
         # 1. 定位 DLL 目录 (合并了你原本代码中的重复逻辑)
         current_dir = Path(__file__).parent.absolute()
@@ -129,7 +243,8 @@ class OsuEnvironment:
             raise ImportError("Missing dependency: pythonnet")
 
         import clr
-        import System  # noqa: F401
+        from System import AppDomain
+        from System.Reflection import Assembly, AssemblyName
 
         # 3. 加载 DLL
         libs_to_load = [
@@ -139,126 +254,455 @@ class OsuEnvironment:
             "osu.Game.Rulesets.Taiko.dll",
             "osu.Game.Rulesets.Catch.dll",
             "osu.Game.Rulesets.Mania.dll",
+            "OsuTools.Helpers.dll",  # 可选的辅助库，缺失时回退到 Python 实现
         ]
 
+        # 已在当前进程加载过的程序集直接跳过
+        loaded = {str(a.GetName().Name) for a in AppDomain.CurrentDomain.GetAssemblies()}
+
         for lib in libs_to_load:
             path = dll_folder / lib
-            if path.exists():
-                try:
-                    clr.AddReference(str(path).replace('.dll', ''))
-                except Exception:
-                    pass  # 忽略已加载或依赖错误
-            else:
-                pass  # 静默失败，calculate 时会报错
+            if not path.exists():
+                continue  # 静默失败，calculate 时会报错
+            try:
+                name = str(AssemblyName.GetAssemblyName(str(path)).Name)
+                if name in loaded:
+                    continue
+                # 按完整路径直接加载，跳过 clr.AddReference 在 sys.path 中的逐目录探测
+                # (不用 Assembly.Load(bytes)：无路径的程序集无法解析同目录依赖，且可能被重复加载)
+                Assembly.LoadFrom(str(path))
+                loaded.add(name)
+            except Exception:
+                pass  # 忽略依赖错误
+
+        # 4. 导入 C# 类型 (每个进程只做一次)
+        _ensure_clr_loaded()
 
         cls._initialized = True
 
 
+# ================= 成绩统计输入 =================
+
+# 模拟函数可能读取的全部统计键
+_KNOWN_STAT_KEYS = frozenset({
+    'great', 'ok', 'meh', 'miss', 'perfect', 'good',
+    'slider_tail_hit', 'large_tick_hit', 'small_tick_hit', 'small_tick_miss'
+})
+# 其中任一大于 0 即视为用户提供了有效统计 (否则按准确率模拟)
+_VALID_STAT_KEYS = ('great', 'ok', 'meh', 'good', 'perfect', 'miss', 'large_tick_hit')
+
+
+def _normalize_stats(statistics: Union[Dict[str, int], Any, None]) -> Optional[Dict[str, int]]:
+    """
+    将 statistics (dict 或对象) 一次性规整为小写键的 dict，只转换实际提供的值。
+    dict 支持 "Miss" 与 "miss" 两种写法，同时存在时以小写为准。
+    :return: 规整后的统计；没有有效统计时返回 None
+    """
+    if not statistics:
+        return None
+    # 值为 None 的字段视为未提供 (API 模型对象中当前模式用不到的字段常为 None)
+    stats: Dict[str, int] = {}
+    if isinstance(statistics, dict):
+        for k, v in statistics.items():
+            if v is None:
+                continue
+            key = k.lower() if isinstance(k, str) else k
+            if key in _KNOWN_STAT_KEYS and (key == k or key not in stats):
+                stats[key] = int(v)
+    else:
+        for k in _KNOWN_STAT_KEYS:
+            v = getattr(statistics, k, None)
+            if v is not None:
+                stats[k] = int(v)
+    for k in _VALID_STAT_KEYS:
+        if stats.get(k, 0) > 0:
+            return stats
+    return None
+
+
+# calculate_batch 中每个 scenario 允许的键 (即 calculate 的成绩参数)
+_SCENARIO_KEYS = frozenset({'mods', 'acc', 'combo', 'misses', 'legacy_total_score', 'statistics'})
+# calculate_many 中每个任务允许的键
+_TASK_KEYS = _SCENARIO_KEYS | {'file_path', 'mode'}
+
+
+def _scenario_error(scenario: Any) -> Optional[str]:
+    """检查单个 scenario 的结构，返回错误信息；合法时返回 None"""
+    if not isinstance(scenario, dict):
+        return f"Invalid scenario: expected dict, got {type(scenario).__name__}"
+    unknown = scenario.keys() - _SCENARIO_KEYS
+    if unknown:
+        return f"Invalid scenario: unknown keys {sorted(map(str, unknown))}"
+    return None
+
+
+# ================= 模拟计算内核 =================
+# 纯标量运算，不触碰任何 C# 对象，便于单独优化
+
+def _sim_osu_counts(acc: float, total: int, misses: int) -> Tuple[int, int, int, int]:
+    """由准确率反推 (n300, n100, n50, misses)，调用方需保证 total > misses"""
+    _round = round
+    relevant: int = total - misses
+    accuracy: float = acc / 100.0
+    n100: int = 0
+    n50: int = 0
+
+    rel_acc: float = max(0.0, min(1.0, accuracy * total / relevant))
+    six_relevant: int = 6 * relevant
+
+    if rel_acc >= 0.25:
+        t: float = 1 - (rel_acc - 0.25) / 0.75
+        ratio: float = t * t
+        c100: float = six_relevant * (1 - rel_acc) / (5 * ratio + 4)
+        c50: float = c100 * ratio
+        n100 = int(_round(c100))
+        n50 = int(_round(c100 + c50) - n100)
+    elif rel_acc >= 1.0 / 6:
+        c100 = six_relevant * rel_acc - relevant
+        c50 = relevant - c100
+        n100 = int(_round(c100))
+        n50 = int(_round(c100 + c50) - n100)
+    else:
+        c50 = six_relevant * rel_acc
+        n50 = int(_round(c50))
+        misses = total - n50
+    n300: int = total - n100 - n50 - misses
+
+    return n300, n100, n50, misses
+
+
+def _sim_taiko_counts(acc: float, total: int, misses: int) -> Tuple[int, int]:
+    """由准确率反推 (n_great, n_good)"""
+    relevant: int = total - misses
+    accuracy: float = acc / 100.0
+    n_great: int = int(round((2 * accuracy - 1) * relevant))
+    n_good: int = relevant - n_great
+    return n_great, n_good
+
+
+# Mania 准确率分段下界；落在第 i 段 (i >= 1) 时按 _MANIA_BUCKETS[i] 在相邻两档判定间插值
+_MANIA_THRESHOLDS = (0.60, 0.80, 0.90, 0.96)
+# (区间上界, 区间宽度)，下标与 bisect 结果对应，第 0 段全部计为 Meh
+_MANIA_BUCKETS = (None, (0.80, 0.20), (0.90, 0.10), (0.96, 0.06), (1, 0.04))
+
+
+def _sim_mania_counts(acc: float, total: int, misses: int) -> Tuple[int, int, int, int, int]:
+    """由准确率反推 (n_perfect, n_great, n_good, n_ok, n_meh)"""
+    relevant: int = total - misses
+    accuracy: float = acc / 100.0
+    counts = [0, 0, 0, 0, 0]
+
+    if relevant > 0:
+        bucket = bisect.bisect_right(_MANIA_THRESHOLDS, accuracy)
+        if bucket == 0:
+            counts[4] = relevant
+        else:
+            upper, width = _MANIA_BUCKETS[bucket]
+            p = 1 - (upper - accuracy) / width
+            n_high = int(round(p * relevant))
+            # 第 4 段 -> Perfect/Great，第 3 段 -> Great/Good ... 第 1 段 -> Ok/Meh
+            counts[4 - bucket] = n_high
+            counts[5 - bucket] = relevant - n_high
+
+    n_perfect, n_great, n_good, n_ok, n_meh = counts
+    return n_perfect, n_great, n_good, n_ok, n_meh
+
+
+# NumPy 向量化的固定开销约 30 µs，数量少时标量循环更快；阈值为实测的交叉点
+_NUMPY_MIN_BATCH_OSU = 40
+_NUMPY_MIN_BATCH_MANIA = 64
+
+
+def _sim_osu_counts_batch(accs: List[float], total: int, misses: List[int]) -> List[Tuple[int, int, int, int]]:
+    """
+    _sim_osu_counts 的批量版本，要求每项 total > misses。
+    安装了 NumPy 且数量达到阈值时整体向量化计算，否则逐项调用标量版本；两者结果一致。
+    """
+    if np is None or len(accs) < _NUMPY_MIN_BATCH_OSU:
+        return [_sim_osu_counts(a, total, m) for a, m in zip(accs, misses)]
+
+    miss = np.asarray(misses, dtype=np.int64)
+    relevant = total - miss
+    accuracy = np.asarray(accs, dtype=np.float64) / 100.0
+    rel_acc = np.maximum(0.0, np.minimum(1.0, accuracy * total / relevant))
+    six_relevant = 6 * relevant
+
+    high = rel_acc >= 0.25
+    mid = ~high & (rel_acc >= 1.0 / 6)
+    low = ~high & ~mid
+
+    t = 1 - (rel_acc - 0.25) / 0.75
+    ratio = t * t
+    c100_high = six_relevant * (1 - rel_acc) / (5 * ratio + 4)
+    c50_high = c100_high * ratio
+    c100_mid = six_relevant * rel_acc - relevant
+    c50_mid = relevant - c100_mid
+
+    c100 = np.where(high, c100_high, c100_mid)
+    c50 = np.where(high, c50_high, c50_mid)
+    n100 = np.where(low, 0, np.round(c100))
+    n50 = np.where(low, np.round(six_relevant * rel_acc), np.round(c100 + c50) - n100)
+    miss = np.where(low, total - n50, miss)
+    n300 = total - n100 - n50 - miss
+
+    return list(zip(
+        n300.astype(np.int64).tolist(),
+        n100.astype(np.int64).tolist(),
+        n50.astype(np.int64).tolist(),
+        miss.astype(np.int64).tolist()
+    ))
+
+
+def _sim_mania_counts_batch(accs: List[float], total: int, misses: List[int]) -> List[Tuple[int, int, int, int, int]]:
+    """_sim_mania_counts 的批量版本，安装了 NumPy 且数量达到阈值时向量化计算"""
+    if np is None or len(accs) < _NUMPY_MIN_BATCH_MANIA:
+        return [_sim_mania_counts(a, total, m) for a, m in zip(accs, misses)]
+
+    relevant = total - np.asarray(misses, dtype=np.int64)
+    accuracy = np.asarray(accs, dtype=np.float64) / 100.0
+    bucket = np.searchsorted(_MANIA_THRESHOLDS, accuracy, side='right')
+
+    # 第 0 段没有插值，用占位的上界/宽度避免除零
+    upper = np.array([1.0] + [b[0] for b in _MANIA_BUCKETS[1:]])[bucket]
+    width = np.array([1.0] + [b[1] for b in _MANIA_BUCKETS[1:]])[bucket]
+    p = 1 - (upper - accuracy) / width
+    n_high = np.where(bucket == 0, 0, np.round(p * relevant)).astype(np.int64)
+
+    counts = np.zeros((len(accs), 5), dtype=np.int64)
+    rows = np.arange(len(accs))
+    interp = (bucket > 0) & (relevant > 0)
+    counts[rows[interp], 4 - bucket[interp]] = n_high[interp]
+    counts[rows[interp], 5 - bucket[interp]] = (relevant - n_high)[interp]
+    only_meh = (bucket == 0) & (relevant > 0)
+    counts[only_meh, 4] = relevant[only_meh]
+
+    return [tuple(row) for row in counts.tolist()]
+
+
+# ================= 谱面预处理 =================
+
+# 超过该大小的谱面不整块读入内存，直接交给 FileStream 流式解码
+_MAX_IN_MEMORY_BEATMAP_SIZE = 50 * 1024 * 1024
+# 流式解码时 FileStream 的读缓冲大小 (默认 4KB，对大文件过小)
+_FILE_STREAM_BUFFER_SIZE = 64 * 1024
+
+
+def _strip_storyboard(raw: bytes) -> bytes:
+    """
+    去掉 [Events] 段中与难度计算无关的行 (背景、视频、故事板)，只保留休息段。
+    找不到 [Events] 段时原样返回。
+    """
+    header = raw.find(b'\n[Events]')
+    if header == -1:
+        return raw
+    body_start = raw.find(b'\n', header + 1)
+    if body_start == -1:
+        return raw
+    body_start += 1
+    # end 指向下一段标题行的行首，[Events] 内各行 (含行尾 \r\n) 完整地落在 body 中
+    end = raw.find(b'\n[', body_start - 1)
+    end = len(raw) if end == -1 else end + 1
+
+    kept = [
+        line for line in raw[body_start:end].splitlines(keepends=True)
+        if line.startswith((b'2,', b'Break,'))
+    ]
+    return raw[:body_start] + b''.join(kept) + raw[end:]
+
+
+# ================= C# 类型缓存 =================
+
+@dataclass
+class _ClrTypes:
+    """进程内共享的 C# 类型句柄，只在首次使用时导入一次"""
+    System: Any
+    FileStream: Any
+    FileMode: Any
+    FileAccess: Any
+    FileShare: Any
+    MemoryStream: Any
+    Marshal: Any
+    # ArrayPool<byte>.Shared，复用读谱面用的 byte[] 缓冲区
+    BytePool: Any
+
+    LegacyBeatmapDecoder: Any
+    LineBufferedReader: Any
+    FlatWorkingBeatmap: Any
+
+    # 预先解析的 HitResult 枚举成员 (HR.Great 等)，免去每次经 pythonnet 查找属性
+    HR: Any
+    # HitResult 成员 -> 名称，供 stats_used 使用，免去逐项 str() 穿越 CLR
+    HitNames: Dict[Any, str]
+    # HitResult 成员 -> 整数值，供 Helpers.SetStatistics 使用
+    HitValues: Dict[Any, int]
+    # Dictionary<HitResult, int>，用于一次性赋值 ScoreInfo.Statistics
+    StatsDict: Any
+    ScoreInfo: Any
+    Mod: Any
+    # 共用的空 Mod[]，无 Mod 时不再每次新建
+    EmptyMods: Any
+
+    # Catch 物件类 (Fruit / Droplet / TinyDroplet / JuiceStream)
+    CatchObjects: Any
+    # OsuTools.Helpers 辅助类，未随包附带时为 None
+    Helpers: Optional[Any]
+    # 模式 -> {大写缩写: Mod}，规则集初始化后一次性构建
+    ModIndex: Dict[int, Dict[str, Any]] = field(default_factory=dict)
+
+    @classmethod
+    def instance(cls, skip_env_check: bool = False) -> "_ClrTypes":
+        if OsuEnvironment.clr_types is None:
+            OsuEnvironment.setup(skip_env_check=skip_env_check)
+        return OsuEnvironment.clr_types
+
+
+# 规则集实例 (无状态，全进程共用一份)
+_RULESETS: Dict[int, Any] = {}
+
+
+def _ensure_clr_loaded() -> None:
+    """导入所有用到的 C# 类型并初始化规则集，重复调用直接返回 (由 OsuEnvironment.setup 调用)"""
+    if OsuEnvironment.clr_types is not None: return
+
+    # 延迟导入 C# 类型以避免模块加载时的错误
+    import System
+    from System.IO import FileStream, FileMode, FileAccess, FileShare, MemoryStream
+    from System.Runtime.InteropServices import Marshal
+    from System.Buffers import ArrayPool
+    from System.Collections.Generic import Dictionary
+
+    # Beatmap & IO
+    from osu.Game.Beatmaps.Formats import LegacyBeatmapDecoder
+    from osu.Game.IO import LineBufferedReader
+    from osu.Game.Beatmaps import FlatWorkingBeatmap
+
+    # Rulesets
+    from osu.Game.Rulesets.Osu import OsuRuleset
+    from osu.Game.Rulesets.Taiko import TaikoRuleset
+    from osu.Game.Rulesets.Catch import CatchRuleset
+    from osu.Game.Rulesets.Mania import ManiaRuleset
+
+    # Mods & Scoring
+    from osu.Game.Rulesets.Mods import Mod
+    from osu.Game.Scoring import ScoreInfo
+    from osu.Game.Rulesets.Scoring import HitResult
+
+    # Catch Objects
+    from osu.Game.Rulesets.Catch.Objects import Fruit, Droplet, TinyDroplet, JuiceStream
+
+    # 辅助库 (可选)
+    try:
+        from OsuTools import Helpers
+    except ImportError:
+        Helpers = None
+
+    hr = types.SimpleNamespace(**{
+        name: getattr(HitResult, name) for name in (
+            'Great', 'Ok', 'Meh', 'Miss', 'Perfect', 'Good', 'SliderTailHit',
+            'LargeTickHit', 'SmallTickHit', 'SmallTickMiss'
+        )
+    })
+
+    clr_types = _ClrTypes(
+        System=System,
+        FileStream=FileStream,
+        FileMode=FileMode,
+        FileAccess=FileAccess,
+        FileShare=FileShare,
+        MemoryStream=MemoryStream,
+        Marshal=Marshal,
+        BytePool=ArrayPool[System.Byte].Shared,
+        LegacyBeatmapDecoder=LegacyBeatmapDecoder,
+        LineBufferedReader=LineBufferedReader,
+        FlatWorkingBeatmap=FlatWorkingBeatmap,
+        HR=hr,
+        HitNames={member: str(member) for member in vars(hr).values()},
+        HitValues={member: int(member) for member in vars(hr).values()},
+        StatsDict=Dictionary[HitResult, System.Int32],
+        ScoreInfo=ScoreInfo,
+        Mod=Mod,
+        EmptyMods=System.Array.CreateInstance(Mod, 0),
+        # Catch 对象类型
+        CatchObjects=types.SimpleNamespace(
+            Fruit=Fruit, Droplet=Droplet, TinyDroplet=TinyDroplet, JuiceStream=JuiceStream
+        ),
+        Helpers=Helpers
+    )
+
+    # 初始化规则集
+    _RULESETS.update({
+        0: OsuRuleset(),
+        1: TaikoRuleset(),
+        2: CatchRuleset(),
+        3: ManiaRuleset()
+    })
+
+    # Mod 查找表：每个规则集只调用一次 CreateAllMods
+    for mode, ruleset in _RULESETS.items():
+        table: Dict[str, Any] = {}
+        for mod in ruleset.CreateAllMods():
+            # 与原先线性查找一致：缩写重复时取第一个
+            table.setdefault(str(mod.Acronym).upper(), mod)
+        clr_types.ModIndex[mode] = table
+
+    OsuEnvironment.clr_types = clr_types
+
+
 # ================= 核心计算类 =================
 
 class OsuCalculator:
-    def __init__(self):
+    def __init__(self, skip_env_check: bool = False):
         """
-        初始化计算器。如果环境未配置，会自动调用 setup。
+        初始化计算器。首次实例化时会配置环境并导入 C# 类型，之后只绑定共享引用。
+        :param skip_env_check: 跳过 .NET 8 Runtime 检查，省去启动 dotnet 子进程的开销
         """
-        if not OsuEnvironment._initialized:
-            OsuEnvironment.setup()
-
-        # 延迟导入 C# 类型以避免模块加载时的错误
-        import System
-        from System.IO import FileStream, FileMode, FileAccess, FileShare
-        from System.Collections.Generic import List as CsList
-
-        # Beatmap & IO
-        from osu.Game.Beatmaps.Formats import LegacyBeatmapDecoder
-        from osu.Game.IO import LineBufferedReader
-        from osu.Game.Beatmaps import FlatWorkingBeatmap
-
-        # Rulesets
-        from osu.Game.Rulesets.Osu import OsuRuleset
-        from osu.Game.Rulesets.Taiko import TaikoRuleset
-        from osu.Game.Rulesets.Catch import CatchRuleset
-        from osu.Game.Rulesets.Mania import ManiaRuleset
-
-        # Mods & Scoring
-        from osu.Game.Rulesets.Mods import Mod
-        from osu.Game.Scoring import ScoreInfo
-        from osu.Game.Rulesets.Scoring import HitResult
-
-        # Difficulty Attributes
-        from osu.Game.Rulesets.Osu.Difficulty import OsuDifficultyAttributes
-        from osu.Game.Rulesets.Taiko.Difficulty import TaikoDifficultyAttributes
-        from osu.Game.Rulesets.Catch.Difficulty import CatchDifficultyAttributes
-        from osu.Game.Rulesets.Mania.Difficulty import ManiaDifficultyAttributes
-
-        # Catch Objects
-        from osu.Game.Rulesets.Catch.Objects import Fruit, Droplet, TinyDroplet, JuiceStream
-
-        # 绑定到实例
-        self.System = System
-        self.FileStream = FileStream
-        self.FileMode = FileMode
-        self.FileAccess = FileAccess
-        self.FileShare = FileShare
-        self.CsList = CsList  # 重命名避免冲突
-
-        self.LegacyBeatmapDecoder = LegacyBeatmapDecoder
-        self.LineBufferedReader = LineBufferedReader
-        self.FlatWorkingBeatmap = FlatWorkingBeatmap
-
-        self.HitResult = HitResult
-        self.ScoreInfo = ScoreInfo
-        self.Mod = Mod
-
-        # Catch 对象类型
-        self.CatchObjects = {
-            'Fruit': Fruit,
-            'Droplet': Droplet,
-            'TinyDroplet': TinyDroplet,
-            'JuiceStream': JuiceStream
-        }
-
-        # 初始化规则集
-        self.rulesets: Dict[int, Any] = {
-            0: OsuRuleset(),
-            1: TaikoRuleset(),
-            2: CatchRuleset(),
-            3: ManiaRuleset()
+        self._t = _ClrTypes.instance(skip_env_check=skip_env_check)
+        self._hr = self._t.HR
+        self._debug = bool(os.environ.get(_DEBUG_ENV))
+        self.rulesets: Dict[int, Any] = _RULESETS
+        # 模式 -> {缩写: Mod}，进程内共享
+        self._mod_index: Dict[int, Dict[str, Any]] = self._t.ModIndex
+        # (abs_path, mtime) -> 解码后的原始 beatmap
+        self._decoded_cache = _LruCache(maxsize=32)
+        # (abs_path, mtime, mode) -> (playable beatmap, working_beatmap, original_ruleset_id)
+        self._beatmap_cache = _LruCache(maxsize=32)
+        # 输入路径 -> (st_dev, st_ino, realpath)，省去重复的 realpath 逐级解析
+        self._path_cache = _LruCache(maxsize=1024)
+        # 路径 -> [锁, 等待数]，只在加载谱面期间存在，避免多线程重复解码同一文件
+        self._load_locks: Dict[str, List[Any]] = {}
+        self._load_locks_guard = threading.Lock()
+        # (mode, mod 缩写) -> Mod[]，与谱面无关，可跨谱面复用
+        self._mods_cache = _LruCache(maxsize=256)
+        # (abs_path, mtime, mode, mod 缩写) -> (csharp_mods, diff_attr)
+        self._diff_cache = _LruCache(maxsize=256)
+        # 模式 -> 判定模拟函数，四个 _sim_* 签名一致
+        self._simulators: Dict[int, Any] = {
+            0: self._sim_osu,
+            1: self._sim_taiko,
+            2: self._sim_catch,
+            3: self._sim_mania,
         }
 
-    def _parse_mods(self, mod_list: Union[List[str], List[Dict], List[Any]], ruleset: Any) -> Any:
+    def _parse_mods(self, acronyms: Tuple[str, ...], mode: int) -> Any:
         """
-        将 Python 输入转换为 C# Mod 列表。
-        :return: System.Collections.Generic.List<osu.Game.Rulesets.Mods.Mod>
+        将已大写化的 Mod 缩写转换为 C# Mod 数组。
+        :return: osu.Game.Rulesets.Mods.Mod[]
         """
-        available_mods = ruleset.CreateAllMods()
-        csharp_mods = self.CsList[self.Mod]()
+        if not acronyms:
+            return self._t.EmptyMods
 
-        if not mod_list:
+        # Mod 顺序会影响计算，键保留原顺序而不排序
+        key = (mode, acronyms)
+        csharp_mods = self._mods_cache.get(key)
+        if csharp_mods is not None:
             return csharp_mods
 
-        for m in mod_list:
-            target_acronym: Optional[str]
-
-            if isinstance(m, str):
-                target_acronym = m
-            elif isinstance(m, dict):
-                target_acronym = m.get("acronym") or m.get("Acronym")
-            else:
-                target_acronym = getattr(m, "acronym", None) or getattr(m, "Acronym", None)
-
-            if not target_acronym:
-                continue
-
-            # 在 C# List 中查找
-            found = next(
-                (x for x in available_mods if str(x.Acronym).upper() == str(target_acronym).upper()),
-                None
-            )
-
-            if found:
-                csharp_mods.Add(found)
+        table = self._mod_index[mode]
+        resolved = [table[a] for a in acronyms if a in table]
 
+        # 由 Python 列表一次性构造 Mod[]，只跨一次边界，而非逐项下标赋值
+        csharp_mods = self._t.System.Array[self._t.Mod](resolved)
+        self._mods_cache.put(key, csharp_mods)
         return csharp_mods
 
     def _get_mod_acronym(self, mod: Union[str, Dict[str, Any], Any]) -> Optional[str]:
@@ -275,178 +719,233 @@ class OsuCalculator:
         key_mods = {"1K", "2K", "3K", "4K", "5K", "6K", "7K", "8K", "9K", "10K"}
         return [mod for mod in mods if (self._get_mod_acronym(mod) or "").upper() not in key_mods]
 
-    def _extract_stat(self, stats_obj: Union[Dict, Any, None], attr_name: str, default: int = 0) -> int:
-        """安全提取统计属性"""
-        if stats_obj is None:
-            return default
-        if isinstance(stats_obj, dict):
-            # 支持 key 为 "Miss" 或 "miss"
-            return stats_obj.get(attr_name, stats_obj.get(attr_name.capitalize(), default))
-        return getattr(stats_obj, attr_name, default)
-
-    def _has_valid_stats(self, stats_obj: Union[Dict, Any, None]) -> bool:
-        """检查是否有有效统计数据"""
-        if not stats_obj:
-            return False
-        keys = ['great', 'ok', 'meh', 'good', 'perfect', 'miss', 'large_tick_hit']
-        for k in keys:
-            if self._extract_stat(stats_obj, k) > 0:
-                return True
-        return False
-
     # ================= 模拟逻辑 (保持原有逻辑，仅添加类型提示) =================
 
-    def _sim_osu(self, acc: float, beatmap: Any, misses: int, stats_obj: Any) -> Dict[Any, int]:
-        if self._has_valid_stats(stats_obj):
+    def _sim_osu(self, acc: float, beatmap: Any, misses: int, stats: Optional[Dict[str, int]]) -> Dict[Any, int]:
+        hr = self._hr
+        if stats is not None:
             return {
-                self.HitResult.Great: self._extract_stat(stats_obj, 'great'),
-                self.HitResult.Ok: self._extract_stat(stats_obj, 'ok'),
-                self.HitResult.Meh: self._extract_stat(stats_obj, 'meh'),
-                self.HitResult.Miss: self._extract_stat(stats_obj, 'miss'),
-                self.HitResult.SliderTailHit: self._extract_stat(stats_obj, 'slider_tail_hit'),
-                self.HitResult.LargeTickHit: self._extract_stat(stats_obj, 'large_tick_hit'),
-                self.HitResult.SmallTickHit: self._extract_stat(stats_obj, 'small_tick_hit'),
-                self.HitResult.SmallTickMiss: self._extract_stat(stats_obj, 'small_tick_miss')
+                hr.Great: stats.get('great', 0),
+                hr.Ok: stats.get('ok', 0),
+                hr.Meh: stats.get('meh', 0),
+                hr.Miss: stats.get('miss', 0),
+                hr.SliderTailHit: stats.get('slider_tail_hit', 0),
+                hr.LargeTickHit: stats.get('large_tick_hit', 0),
+                hr.SmallTickHit: stats.get('small_tick_hit', 0),
+                hr.SmallTickMiss: stats.get('small_tick_miss', 0)
             }
 
         # Fallback 模拟
         total = beatmap.HitObjects.Count
-        relevant = total - misses
-        accuracy = acc / 100.0
-        n300, n100, n50 = 0, 0, 0
-
-        if relevant <= 0: return {self.HitResult.Miss: misses}
-        rel_acc = max(0.0, min(1.0, accuracy * total / relevant))
-
-        if rel_acc >= 0.25:
-            ratio = math.pow(1 - (rel_acc - 0.25) / 0.75, 2)
-            c100 = 6 * relevant * (1 - rel_acc) / (5 * ratio + 4)
-            c50 = c100 * ratio
-            n100 = int(round(c100))
-            n50 = int(round(c100 + c50) - n100)
-        elif rel_acc >= 1.0 / 6:
-            c100 = 6 * relevant * rel_acc - relevant
-            c50 = relevant - c100
-            n100 = int(round(c100))
-            n50 = int(round(c100 + c50) - n100)
-        else:
-            c50 = 6 * relevant * rel_acc
-            n50 = int(round(c50))
-            misses = total - n50
-        n300 = total - n100 - n50 - misses
+        if total - misses <= 0: return {hr.Miss: misses}
+        return self._osu_stats_from_counts(*_sim_osu_counts(acc, total, misses))
 
+    def _osu_stats_from_counts(self, n300: int, n100: int, n50: int, misses: int) -> Dict[Any, int]:
+        hr = self._hr
         return {
-            self.HitResult.Great: max(0, n300),
-            self.HitResult.Ok: max(0, n100),
-            self.HitResult.Meh: max(0, n50),
-            self.HitResult.Miss: max(0, misses)
+            hr.Great: n300 if n300 > 0 else 0,
+            hr.Ok: n100 if n100 > 0 else 0,
+            hr.Meh: n50 if n50 > 0 else 0,
+            hr.Miss: misses if misses > 0 else 0
         }
 
-    def _sim_taiko(self, acc: float, beatmap: Any, misses: int, stats_obj: Any) -> Dict[Any, int]:
-        if self._has_valid_stats(stats_obj):
+    def _sim_taiko(self, acc: float, beatmap: Any, misses: int, stats: Optional[Dict[str, int]]) -> Dict[Any, int]:
+        hr = self._hr
+        if stats is not None:
             return {
-                self.HitResult.Great: self._extract_stat(stats_obj, 'great'),
-                self.HitResult.Ok: self._extract_stat(stats_obj, 'ok'),
-                self.HitResult.Miss: self._extract_stat(stats_obj, 'miss')
+                hr.Great: stats.get('great', 0),
+                hr.Ok: stats.get('ok', 0),
+                hr.Miss: stats.get('miss', 0)
             }
 
-        total = beatmap.HitObjects.Count
-        relevant = total - misses
-        accuracy = acc / 100.0
-        n_great = int(round((2 * accuracy - 1) * relevant))
-        n_good = relevant - n_great
+        n_great, n_good = _sim_taiko_counts(acc, beatmap.HitObjects.Count, misses)
         return {
-            self.HitResult.Great: max(0, n_great),
-            self.HitResult.Ok: max(0, n_good),
-            self.HitResult.Miss: max(0, misses)
+            hr.Great: n_great if n_great > 0 else 0,
+            hr.Ok: n_good if n_good > 0 else 0,
+            hr.Miss: misses if misses > 0 else 0
         }
 
-    def _sim_mania(self, acc: float, beatmap: Any, misses: int, stats_obj: Any) -> Dict[Any, int]:
-        if self._has_valid_stats(stats_obj):
+    def _sim_mania(self, acc: float, beatmap: Any, misses: int, stats: Optional[Dict[str, int]]) -> Dict[Any, int]:
+        hr = self._hr
+        if stats is not None:
             return {
-                self.HitResult.Perfect: self._extract_stat(stats_obj, 'perfect'),
-                self.HitResult.Great: self._extract_stat(stats_obj, 'great'),
-                self.HitResult.Good: self._extract_stat(stats_obj, 'good'),
-                self.HitResult.Ok: self._extract_stat(stats_obj, 'ok'),
-                self.HitResult.Meh: self._extract_stat(stats_obj, 'meh'),
-                self.HitResult.Miss: self._extract_stat(stats_obj, 'miss')
+                hr.Perfect: stats.get('perfect', 0),
+                hr.Great: stats.get('great', 0),
+                hr.Good: stats.get('good', 0),
+                hr.Ok: stats.get('ok', 0),
+                hr.Meh: stats.get('meh', 0),
+                hr.Miss: stats.get('miss', 0)
             }
-        total = beatmap.HitObjects.Count
-        relevant = total - misses
-        accuracy = acc / 100.0
-        n_perfect, n_great, n_good, n_ok, n_meh = 0, 0, 0, 0, 0
-
-        if relevant > 0:
-            if accuracy >= 0.96:
-                p = 1 - (1 - accuracy) / 0.04
-                n_perfect = int(round(p * relevant))
-                n_great = relevant - n_perfect
-            elif accuracy >= 0.90:
-                p = 1 - (0.96 - accuracy) / 0.06
-                n_great = int(round(p * relevant))
-                n_good = relevant - n_great
-            elif accuracy >= 0.80:
-                p = 1 - (0.90 - accuracy) / 0.10
-                n_good = int(round(p * relevant))
-                n_ok = relevant - n_good
-            elif accuracy >= 0.60:
-                p = 1 - (0.80 - accuracy) / 0.20
-                n_ok = int(round(p * relevant))
-                n_meh = relevant - n_ok
-            else:
-                n_meh = relevant
+        n_perfect, n_great, n_good, n_ok, n_meh = _sim_mania_counts(acc, beatmap.HitObjects.Count, misses)
+        return self._mania_stats_from_counts(n_perfect, n_great, n_good, n_ok, n_meh, misses)
 
+    def _mania_stats_from_counts(
+            self, n_perfect: int, n_great: int, n_good: int, n_ok: int, n_meh: int, misses: int
+    ) -> Dict[Any, int]:
+        hr = self._hr
         return {
-            self.HitResult.Perfect: max(0, n_perfect),
-            self.HitResult.Great: max(0, n_great),
-            self.HitResult.Good: max(0, n_good),
-            self.HitResult.Ok: max(0, n_ok),
-            self.HitResult.Meh: max(0, n_meh),
-            self.HitResult.Miss: max(0, misses)
+            hr.Perfect: n_perfect if n_perfect > 0 else 0,
+            hr.Great: n_great if n_great > 0 else 0,
+            hr.Good: n_good if n_good > 0 else 0,
+            hr.Ok: n_ok if n_ok > 0 else 0,
+            hr.Meh: n_meh if n_meh > 0 else 0,
+            hr.Miss: misses if misses > 0 else 0
         }
 
-    def _sim_catch(self, acc: float, beatmap: Any, misses: int, stats_obj: Any) -> Dict[Any, int]:
-        if self._has_valid_stats(stats_obj):
+    def _sim_catch(self, acc: float, beatmap: Any, misses: int, stats: Optional[Dict[str, int]]) -> Dict[Any, int]:
+        hr = self._hr
+        if stats is not None:
             return {
-                self.HitResult.Great: self._extract_stat(stats_obj, 'great'),
-                self.HitResult.LargeTickHit: self._extract_stat(stats_obj, 'large_tick_hit'),
-                self.HitResult.SmallTickHit: self._extract_stat(stats_obj, 'small_tick_hit'),
-                self.HitResult.SmallTickMiss: self._extract_stat(stats_obj, 'small_tick_miss'),
-                self.HitResult.Miss: self._extract_stat(stats_obj, 'miss')
+                hr.Great: stats.get('great', 0),
+                hr.LargeTickHit: stats.get('large_tick_hit', 0),
+                hr.SmallTickHit: stats.get('small_tick_hit', 0),
+                hr.SmallTickMiss: stats.get('small_tick_miss', 0),
+                hr.Miss: stats.get('miss', 0)
             }
 
-        Fruit = self.CatchObjects['Fruit']
-        Droplet = self.CatchObjects['Droplet']
-        TinyDroplet = self.CatchObjects['TinyDroplet']
-        JuiceStream = self.CatchObjects['JuiceStream']
-
-        max_fruits = 0
-        max_droplets_total = 0
-        max_tiny_droplets = 0
-
-        for h in beatmap.HitObjects:
-            if isinstance(h, Fruit):
-                max_fruits += 1
-            elif isinstance(h, JuiceStream):
-                for n in h.NestedHitObjects:
-                    if isinstance(n, TinyDroplet):
-                        max_tiny_droplets += 1
-                        max_droplets_total += 1
-                    elif isinstance(n, Droplet):
-                        max_droplets_total += 1
-                    elif isinstance(n, Fruit):
-                        max_fruits += 1
-
-        max_droplets = max_droplets_total - max_tiny_droplets
-        count_droplets = max(0, max_droplets - misses)
+        helpers = self._t.Helpers
+        if helpers is not None:
+            # 整个计数循环在 C# 内完成，只跨边界一次
+            res = helpers.ComputeCatchMaxCombo(beatmap)
+            max_fruits, max_tiny_droplets = res.Item1, res.Item3
+            max_droplets = res.Item2 - max_tiny_droplets
+        else:
+            # 循环不变量提前绑定为局部变量
+            objects = self._t.CatchObjects
+            Fruit, Droplet = objects.Fruit, objects.Droplet
+            TinyDroplet, JuiceStream = objects.TinyDroplet, objects.JuiceStream
+            is_a = isinstance
+            max_fruits = max_droplets_total = max_tiny_droplets = 0
+
+            # 按下标访问，避免 IEnumerator 每个元素两次 (MoveNext + Current) 的跨边界调用
+            objs = beatmap.HitObjects
+            for i in range(objs.Count):
+                h = objs[i]
+                if is_a(h, Fruit):
+                    max_fruits += 1
+                elif is_a(h, JuiceStream):
+                    nested = h.NestedHitObjects
+                    for j in range(nested.Count):
+                        n = nested[j]
+                        # TinyDroplet 是 Droplet 的子类，需先判断
+                        if is_a(n, TinyDroplet):
+                            max_tiny_droplets += 1
+                            max_droplets_total += 1
+                        elif is_a(n, Droplet):
+                            max_droplets_total += 1
+                        elif is_a(n, Fruit):
+                            max_fruits += 1
+
+            max_droplets = max_droplets_total - max_tiny_droplets
+
+        count_droplets = max_droplets - misses
+        if count_droplets < 0: count_droplets = 0
 
         return {
-            self.HitResult.Great: max_fruits,
-            self.HitResult.LargeTickHit: count_droplets,
-            self.HitResult.SmallTickHit: max_tiny_droplets,
-            self.HitResult.Miss: misses
+            hr.Great: max_fruits,
+            hr.LargeTickHit: count_droplets,
+            hr.SmallTickHit: max_tiny_droplets,
+            hr.Miss: misses
         }
 
+    # ================= 谱面加载与缓存 =================
+
+    def _open_beatmap_stream(self, abs_path: str, size: int) -> Tuple[Any, Optional[Any]]:
+        """
+        读入整个谱面文件并去掉故事板，包装为 C# MemoryStream (超大文件回退到 FileStream)。
+        :return: (stream, 从 BytePool 租用的 byte[] 或 None)，用完后需归还缓冲区
+        """
+        # size 来自 calculate_batch 的同一次 stat，与缓存键中的 mtime 一致
+        if size > _MAX_IN_MEMORY_BEATMAP_SIZE:
+            return self._t.FileStream(
+                abs_path, self._t.FileMode.Open, self._t.FileAccess.Read, self._t.FileShare.Read,
+                _FILE_STREAM_BUFFER_SIZE
+            ), None
+
+        with open(abs_path, 'rb') as f:
+            raw = _strip_storyboard(f.read())
+
+        # 从共享池租用 byte[] (长度可能大于请求值)，通过指针整块拷贝，避免 pythonnet 逐字节转换
+        System = self._t.System
+        size = len(raw)
+        buf = self._t.BytePool.Rent(max(size, _FILE_STREAM_BUFFER_SIZE))
+        if raw:
+            addr = ctypes.cast(ctypes.c_char_p(raw), ctypes.c_void_p).value
+            self._t.Marshal.Copy(System.IntPtr(addr), buf, 0, size)
+        return self._t.MemoryStream(buf, 0, size, False), buf
+
+    def _decode_beatmap(self, abs_path: str, mtime: int, size: int) -> Any:
+        """解码谱面 (未转换)，结果按 (路径, 修改时间) 缓存，供不同模式的转换共用"""
+        key = (abs_path, mtime)
+        beatmap = self._decoded_cache.get(key)
+        if beatmap is not None:
+            return beatmap
+
+        fs = None
+        rented = None
+        reader = None
+        try:
+            fs, rented = self._open_beatmap_stream(abs_path, size)
+            reader = self._t.LineBufferedReader(fs)
+            decoder = self._t.LegacyBeatmapDecoder()
+            beatmap = decoder.Decode(reader)
+        finally:
+            if reader: reader.Dispose()
+            if fs: fs.Dispose()
+            if rented is not None: self._t.BytePool.Return(rented)
+
+        self._decoded_cache.put(key, beatmap)
+        return beatmap
+
+    def _load_beatmap(self, abs_path: str, mtime: int, size: int, mode: int, ruleset: Any) -> Tuple[Any, Any, int]:
+        """
+        转换谱面到指定模式，结果按 (路径, 修改时间, 模式) 缓存。
+        :return: (无 Mod 的可玩 beatmap, 基于解码结果的 FlatWorkingBeatmap, 谱面原始规则集 ID)
+        """
+        key = (abs_path, mtime, mode)
+        cached = self._beatmap_cache.get(key)
+        if cached is not None:
+            return cached
+
+        with self._path_lock(abs_path):
+            # 等锁期间其他线程可能已完成加载
+            cached = self._beatmap_cache.get(key)
+            if cached is not None:
+                return cached
+
+            decoded = self._decode_beatmap(abs_path, mtime, size)
+            original_ruleset_id = decoded.BeatmapInfo.Ruleset.OnlineID
+
+            # 与 osu-tools 一致，难度计算器基于解码结果工作：每次 Calculate 都经
+            # GetPlayableBeatmap 重新转换出新的 HitObject 再应用 Mod 与 ApplyDefaults，
+            # 不会修改缓存中的对象，因此不同 Mod、不同线程之间可以安全共享
+            working_beatmap = self._t.FlatWorkingBeatmap(decoded)
+
+            # 模拟判定只读取物件数量 (Catch 还需 ApplyDefaults 生成的内嵌物件)，
+            # 使用单独转换出的无 Mod 可玩谱面，它不会交给难度计算器
+            beatmap = working_beatmap.GetPlayableBeatmap(ruleset.RulesetInfo, self._t.EmptyMods)
+
+            cached = (beatmap, working_beatmap, original_ruleset_id)
+            self._beatmap_cache.put(key, cached)
+            return cached
+
+    @contextmanager
+    def _path_lock(self, abs_path: str) -> Iterator[None]:
+        """按路径加锁，锁在没有线程使用后即删除，数量不随处理过的文件增长"""
+        with self._load_locks_guard:
+            entry = self._load_locks.get(abs_path)
+            if entry is None:
+                entry = self._load_locks[abs_path] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._load_locks_guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._load_locks[abs_path]
+
     # ================= 主计算函数 =================
 
     def calculate(
@@ -473,59 +972,224 @@ class OsuCalculator:
         :param statistics: Detailed hit statistics (dict or object), e.g. {'great': 300, 'ok': 10}.
         :return: CalculationResult object.
         """
-        if mods is None: mods = []
-        abs_path = os.path.abspath(file_path)
+        return self.calculate_batch(file_path, mode, scenarios=[{
+            'mods': mods,
+            'acc': acc,
+            'combo': combo,
+            'misses': misses,
+            'legacy_total_score': legacy_total_score,
+            'statistics': statistics
+        }])[0]
+
+    def calculate_many(
+            self,
+            tasks: List[Dict[str, Any]],
+            max_workers: Optional[int] = None
+    ) -> List[CalculationResult]:
+        """
+        Calculates many independent scores concurrently on a thread pool.
+
+        :param tasks: One dict per score with the keyword arguments of `calculate` (file_path is required).
+        :param max_workers: Thread count, passed to ThreadPoolExecutor (None = its default).
+        :return: List of CalculationResult objects, in the same order as 'tasks'.
+        """
+        if not tasks:
+            return []
+        # 难度/PP 计算在 C# 侧执行时 pythonnet 会释放 GIL，可跨线程并行；
+        # 缓存的谱面对象只读 (难度计算每次自行转换)，同一谱面的任务也可并行
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(self._run_task, tasks))
+
+    def _run_task(self, task: Any) -> CalculationResult:
+        """执行 calculate_many 的单个任务，参数错误只影响该任务自身的结果"""
+        if not isinstance(task, dict):
+            return CalculationResult(error=f"Invalid task: expected dict, got {type(task).__name__}")
+        if 'file_path' not in task:
+            return CalculationResult(error="Invalid task: missing 'file_path'")
+        unknown = task.keys() - _TASK_KEYS
+        if unknown:
+            return CalculationResult(error=f"Invalid task: unknown keys {sorted(map(str, unknown))}")
+        try:
+            return self.calculate(**task)
+        except Exception as e:
+            logger.debug("calculate failed: %s", task.get('file_path'), exc_info=True)
+            if self._debug: traceback.print_exc()
+            return CalculationResult(error=str(e))
+
+    def calculate_batch(
+            self,
+            file_path: str,
+            mode: int = 0,
+            *,
+            scenarios: List[Dict[str, Any]]
+    ) -> List[CalculationResult]:
+        """
+        Calculates several scores on the same beatmap, loading it and creating the calculators only once.
 
-        if not os.path.exists(abs_path):
-            return CalculationResult(error=f"File not found: {abs_path}")
+        :param file_path: Path to the .osu beatmap file.
+        :param mode: Game mode (0=Osu, 1=Taiko, 2=Catch, 3=Mania).
+        :param scenarios: Required, keyword-only. One dict per score with any keyword arguments of `calculate`
+                          (mods, acc, combo, misses, legacy_total_score, statistics).
+                          An invalid scenario only produces an error result for itself.
+        :return: List of CalculationResult objects, in the same order as 'scenarios'.
+        """
+        # 一次 stat 同时完成存在性/普通文件检查并取得修改时间 (缓存失效依据)
+        try:
+            st = os.stat(file_path)
+        except OSError:
+            st = None
+        if st is None or not stat.S_ISREG(st.st_mode):
+            return [CalculationResult(error=f"File not found: {os.path.abspath(file_path)}") for _ in scenarios]
+        mtime = st.st_mtime_ns
+        abs_path = self._resolve_path(file_path, st)
 
         ruleset = self.rulesets.get(mode)
         if not ruleset:
-            return CalculationResult(error=f"Invalid mode: {mode}")
+            return [CalculationResult(error=f"Invalid mode: {mode}") for _ in scenarios]
 
-        fs = None
-        reader = None
         try:
-            # 1. 加载谱面
-            fs = self.FileStream(abs_path, self.FileMode.Open, self.FileAccess.Read, self.FileShare.Read)
-            reader = self.LineBufferedReader(fs)
-            decoder = self.LegacyBeatmapDecoder()
-            beatmap = decoder.Decode(reader)
+            # 1. 加载谱面 (同一文件未修改时复用解码结果)
+            beatmap, working_beatmap, original_ruleset_id = self._load_beatmap(
+                abs_path, mtime, st.st_size, mode, ruleset
+            )
+        except Exception as e:
+            logger.debug("calculate failed: %s", file_path, exc_info=True)
+            if self._debug: traceback.print_exc()
+            return [CalculationResult(error=str(e)) for _ in scenarios]
+
+        ctx = _BeatmapContext(
+            abs_path=abs_path,
+            mtime=mtime,
+            mode=mode,
+            ruleset=ruleset,
+            beatmap=beatmap,
+            working_beatmap=working_beatmap,
+            original_ruleset_id=original_ruleset_id
+        )
+        sim_stats = self._batch_sim_stats(ctx, scenarios)
+        results: List[CalculationResult] = []
+        for i, scenario in enumerate(scenarios):
+            error = _scenario_error(scenario)
+            if error is not None:
+                results.append(CalculationResult(error=error))
+                continue
+            try:
+                results.append(self._calculate_score(ctx, sim_stats=sim_stats.get(i), **scenario))
+            except Exception as e:
+                logger.debug("calculate failed: %s", ctx.abs_path, exc_info=True)
+                if self._debug: traceback.print_exc()
+                results.append(CalculationResult(error=str(e)))
+        return results
+
+    def _resolve_path(self, file_path: str, st: os.stat_result) -> str:
+        """
+        解析真实路径并缓存。相对路径连同当前目录一起作为键；
+        用 stat 得到的 (设备, inode) 校验，符号链接改指向其他文件时重新解析
+        """
+        path = os.fspath(file_path)
+        key = path if os.path.isabs(path) else (os.getcwd(), path)
+        cached = self._path_cache.get(key)
+        if cached is not None and cached[0] == st.st_dev and cached[1] == st.st_ino:
+            return cached[2]
+
+        abs_path = os.path.realpath(path)
+        self._path_cache.put(key, (st.st_dev, st.st_ino, abs_path))
+        return abs_path
+
+    def _batch_sim_stats(self, ctx: _BeatmapContext, scenarios: List[Dict[str, Any]]) -> Dict[int, Dict[Any, int]]:
+        """
+        对没有提供 statistics 的成绩，一次性按准确率批量模拟判定数 (仅 osu! 与 mania)。
+        :return: scenario 下标 -> 判定统计
+        """
+        if ctx.mode not in (0, 3) or len(scenarios) < 2:
+            return {}
+
+        total = ctx.beatmap.HitObjects.Count
+        indices: List[int] = []
+        accs: List[float] = []
+        misses: List[int] = []
+        for i, sc in enumerate(scenarios):
+            # 参数有误的成绩不参与批量模拟，交给 _calculate_score 逐个模拟 (出错时在其中返回 error)
+            if _scenario_error(sc) is not None:
+                continue
+            sc_acc = sc.get('acc', 100.0)
+            sc_misses = sc.get('misses', 0)
+            if not isinstance(sc_acc, (int, float)) or not isinstance(sc_misses, int):
+                continue
+            try:
+                if _normalize_stats(sc.get('statistics')) is not None:
+                    continue
+            except (TypeError, ValueError):
+                continue
+            if ctx.mode == 3 or total - sc_misses > 0:
+                indices.append(i)
+                accs.append(float(sc_acc))
+                misses.append(sc_misses)
+        if len(indices) < 2:
+            return {}
 
-            original_ruleset_id = beatmap.BeatmapInfo.Ruleset.OnlineID
-            converter = ruleset.CreateBeatmapConverter(beatmap)
-            if converter.CanConvert():
-                beatmap = converter.Convert()
-            working_beatmap = self.FlatWorkingBeatmap(beatmap)
+        if ctx.mode == 0:
+            counts = _sim_osu_counts_batch(accs, total, misses)
+            return {i: self._osu_stats_from_counts(*c) for i, c in zip(indices, counts)}
 
-            # 2. Mod 解析与难度计算
-            if mode == 3 and original_ruleset_id != 3:
+        counts = _sim_mania_counts_batch(accs, total, misses)
+        return {i: self._mania_stats_from_counts(*c, m) for i, c, m in zip(indices, counts, misses)}
+
+    def _calculate_score(
+            self,
+            ctx: _BeatmapContext,
+            mods: Optional[List[Union[str, Dict[str, Any], Any]]] = None,
+            acc: float = 100.0,
+            combo: Optional[int] = None,
+            misses: int = 0,
+            legacy_total_score: Optional[int] = None,
+            statistics: Optional[Union[Dict[str, int], Any]] = None,
+            sim_stats: Optional[Dict[Any, int]] = None
+    ) -> CalculationResult:
+        """在已加载的谱面上计算单个成绩，sim_stats 为 calculate_batch 预先模拟的判定统计"""
+        if mods is None: mods = []
+        mode = ctx.mode
+        ruleset = ctx.ruleset
+        beatmap = ctx.beatmap
+
+        try:
+            # 2. Mod 解析与难度计算 (难度只取决于谱面与 Mod，可跨成绩复用)
+            if mode == 3 and ctx.original_ruleset_id != 3:
                 mods = self._filter_mods_for_converted_mania(mods)
-            csharp_mods = self._parse_mods(mods, ruleset)
-            diff_calc = ruleset.CreateDifficultyCalculator(working_beatmap)
-            diff_attr = diff_calc.Calculate(csharp_mods)
+            # 每个输入 Mod 只做一次 str/upper，同时作为缓存键与查找键
+            mods_key = tuple(str(self._get_mod_acronym(m) or "").upper() for m in mods)
+            diff_key = (ctx.abs_path, ctx.mtime, mode, mods_key)
+            cached_diff = self._diff_cache.get(diff_key)
+            if cached_diff is None:
+                csharp_mods = self._parse_mods(mods_key, mode)
+                if ctx.diff_calc is None:
+                    ctx.diff_calc = ruleset.CreateDifficultyCalculator(ctx.working_beatmap)
+                diff_attr = ctx.diff_calc.Calculate(csharp_mods)
+                self._diff_cache.put(diff_key, (csharp_mods, diff_attr))
+            else:
+                csharp_mods, diff_attr = cached_diff
 
             # 3. Hit Results 填充
             stats: Dict[Any, int] = {}
 
+            # 输入统计只规整一次，之后各处直接按小写键读取
+            user_stats = _normalize_stats(statistics)
             effective_misses = misses
-            if self._has_valid_stats(statistics):
-                effective_misses = self._extract_stat(statistics, 'miss')
-
-            if mode == 0:
-                stats = self._sim_osu(acc, beatmap, effective_misses, statistics)
-            elif mode == 1:
-                stats = self._sim_taiko(acc, beatmap, effective_misses, statistics)
-            elif mode == 2:
-                stats = self._sim_catch(acc, beatmap, effective_misses, statistics)
-            elif mode == 3:
-                stats = self._sim_mania(acc, beatmap, effective_misses, statistics)
+            if user_stats is not None:
+                effective_misses = user_stats.get('miss', 0)
+
+            if sim_stats is not None:
+                stats = sim_stats
+            else:
+                simulate = self._simulators.get(mode)
+                if simulate is not None:
+                    stats = simulate(acc, beatmap, effective_misses, user_stats)
 
             # 4. 构造 ScoreInfo
-            score = self.ScoreInfo()
+            score = self._t.ScoreInfo()
             score.Ruleset = ruleset.RulesetInfo
-            score.BeatmapInfo = working_beatmap.BeatmapInfo
-            score.Mods = csharp_mods.ToArray()
+            score.BeatmapInfo = ctx.working_beatmap.BeatmapInfo
+            score.Mods = csharp_mods
 
             # 设置 Legacy Score 以启用 Stable 物理/判定逻辑
             score.LegacyTotalScore = int(legacy_total_score) if legacy_total_score is not None and int(
@@ -534,11 +1198,21 @@ class OsuCalculator:
             score.MaxCombo = int(combo) if combo is not None else diff_attr.MaxCombo
             score.Accuracy = float(acc) / 100.0
 
-            for result, count in stats.items():
-                if count > 0:
-                    score.Statistics[result] = count
+            helpers = self._t.Helpers
+            if helpers is not None:
+                # 辅助库在 C# 内建字典并赋值，整个 Statistics 只需一次调用
+                hit_values = self._t.HitValues
+                helpers.SetStatistics(score, [hit_values[k] for k in stats], list(stats.values()))
+            else:
+                # 在本地字典中填好后整体赋值，避免每项都经 score.Statistics 属性取值
+                score_stats = self._t.StatsDict()
+                for result, count in stats.items():
+                    if count > 0:
+                        score_stats[result] = count
+                score.Statistics = score_stats
 
             # 5. 计算 PP
+            # PerformanceCalculator 在字段中保存单个成绩的状态，每个成绩单独创建
             perf_calc = ruleset.CreatePerformanceCalculator()
             pp_attr = perf_calc.Calculate(score, diff_attr)
 
@@ -549,7 +1223,8 @@ class OsuCalculator:
 
 
             # 返回结构化数据
-            stats_readable = {str(k): v for k, v in stats.items()}
+            hit_names = self._t.HitNames
+            stats_readable = {hit_names[k]: v for k, v in stats.items()}
 
             return CalculationResult(
                 mode=mode,
@@ -564,9 +1239,7 @@ class OsuCalculator:
             )
 
         except Exception as e:
-            import traceback
-            traceback.print_exc()
+            # 错误已通过 CalculationResult.error 返回，堆栈只在开启 DEBUG 日志或 OSU_LIB_DEBUG 时格式化输出
+            logger.debug("calculate failed: %s", ctx.abs_path, exc_info=True)
+            if self._debug: traceback.print_exc()
             return CalculationResult(error=str(e))
-        finally:
-            if reader: reader.Dispose()
-            if fs: fs.Dispose()
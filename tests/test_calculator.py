@@ -0,0 +1,127 @@
+"""纯 Python 辅助函数的测试不需要 .NET 运行时；需要运行时的测试在其不可用时跳过"""
+import random
+import types
+from pathlib import Path
+
+import pytest
+
+from osu_tools import calculator
+from osu_tools.calculator import OsuCalculator, _normalize_stats, _scenario_error
+
+TEST_BEATMAP = Path(__file__).resolve().parent.parent / "test.osu"
+
+
+def test_normalize_stats_empty():
+    assert _normalize_stats(None) is None
+    assert _normalize_stats({}) is None
+    assert _normalize_stats({'great': 0, 'slider_tail_hit': 5}) is None
+
+
+def test_normalize_stats_dict_keys():
+    assert _normalize_stats({'Great': 5, 'Ok': 2}) == {'great': 5, 'ok': 2}
+    # 同时给出两种写法时以小写为准，与顺序无关
+    assert _normalize_stats({'miss': 1, 'Miss': 4}) == {'miss': 1}
+    assert _normalize_stats({'Miss': 4, 'miss': 1}) == {'miss': 1}
+    assert _normalize_stats({'great': 3, 'unknown': 7}) == {'great': 3}
+
+
+def test_normalize_stats_none_values():
+    assert _normalize_stats({'great': 5, 'ok': None}) == {'great': 5}
+    assert _normalize_stats({'great': None}) is None
+
+
+def test_normalize_stats_object():
+    score = types.SimpleNamespace(
+        great=500, ok=20, miss=3, meh=None, perfect=None, good=None,
+        slider_tail_hit=None, large_tick_hit=None, small_tick_hit=None, small_tick_miss=None
+    )
+    assert _normalize_stats(score) == {'great': 500, 'ok': 20, 'miss': 3}
+    assert _normalize_stats(types.SimpleNamespace(great=0)) is None
+
+
+@pytest.fixture(scope="module")
+def new_calculator():
+    """每次调用返回一个缓存为空的计算器；.NET 运行时或 DLL 不可用时跳过"""
+    try:
+        OsuCalculator()
+    except Exception as e:
+        pytest.skip(f".NET runtime or osu! assemblies unavailable: {e}")
+    return OsuCalculator
+
+
+@pytest.mark.parametrize("mode", [0, 1, 2, 3])
+def test_cached_beatmap_not_mutated_by_mods(new_calculator, mode):
+    # 先用 HR 计算，再在同一计算器 (复用缓存的谱面) 上计算无 Mod，应与全新计算器一致
+    fresh = new_calculator().calculate(str(TEST_BEATMAP), mode=mode, acc=98.0)
+    assert fresh.error is None
+
+    calc = new_calculator()
+    assert calc.calculate(str(TEST_BEATMAP), mode=mode, mods=["HR"], acc=98.0).error is None
+    cached = calc.calculate(str(TEST_BEATMAP), mode=mode, acc=98.0)
+
+    assert cached == fresh
+
+
+def test_scenario_error():
+    assert _scenario_error({'acc': 99.0, 'mods': ['HD']}) is None
+    assert _scenario_error({}) is None
+    assert 'accuracy' in _scenario_error({'accuracy': 99})
+    assert 'expected dict' in _scenario_error(['HD'])
+
+
+@pytest.mark.parametrize("kernel", ["osu", "mania"])
+def test_batch_kernels_match_scalar(monkeypatch, kernel):
+    pytest.importorskip("numpy")
+    # 阈值置 0，强制走向量化路径
+    monkeypatch.setattr(calculator, "_NUMPY_MIN_BATCH_OSU", 0)
+    monkeypatch.setattr(calculator, "_NUMPY_MIN_BATCH_MANIA", 0)
+    scalar = getattr(calculator, f"_sim_{kernel}_counts")
+    batch = getattr(calculator, f"_sim_{kernel}_counts_batch")
+
+    rng = random.Random(0)
+    for _ in range(200):
+        total = rng.randint(1, 3000)
+        n = rng.randint(1, 100)
+        accs = [rng.choice([rng.uniform(0, 100), rng.uniform(90, 100), float(rng.randint(0, 100))]) for _ in range(n)]
+        misses = [rng.randint(0, total - 1) for _ in range(n)]
+        assert batch(accs, total, misses) == [scalar(a, total, m) for a, m in zip(accs, misses)]
+
+
+def _mania_counts_ladder(acc, total, misses):
+    """原先 _sim_mania 中逐段 if/elif 的实现，作为查表版本的参照"""
+    relevant = total - misses
+    accuracy = acc / 100.0
+    n_perfect, n_great, n_good, n_ok, n_meh = 0, 0, 0, 0, 0
+    if relevant > 0:
+        if accuracy >= 0.96:
+            p = 1 - (1 - accuracy) / 0.04
+            n_perfect = int(round(p * relevant))
+            n_great = relevant - n_perfect
+        elif accuracy >= 0.90:
+            p = 1 - (0.96 - accuracy) / 0.06
+            n_great = int(round(p * relevant))
+            n_good = relevant - n_great
+        elif accuracy >= 0.80:
+            p = 1 - (0.90 - accuracy) / 0.10
+            n_good = int(round(p * relevant))
+            n_ok = relevant - n_good
+        elif accuracy >= 0.60:
+            p = 1 - (0.80 - accuracy) / 0.20
+            n_ok = int(round(p * relevant))
+            n_meh = relevant - n_ok
+        else:
+            n_meh = relevant
+    return n_perfect, n_great, n_good, n_ok, n_meh
+
+
+def test_mania_counts_match_ladder():
+    boundaries = [60.0, 80.0, 90.0, 96.0]
+    eps = [-1e-9, 0.0, 1e-9]
+    accs = [b + e for b in boundaries for e in eps]
+    accs += [x / 4 for x in range(-40, 441)]  # -10 ~ 110，包括 < 0 与 > 100
+    accs += [float('-inf'), -1e6, 1e6]
+    for total in (0, 1, 2, 7, 100, 1234):
+        for misses in (0, 1, 5, total):
+            for acc in accs:
+                expected = _mania_counts_ladder(acc, total, misses)
+                assert calculator._sim_mania_counts(acc, total, misses) == expected, (acc, total, misses)
@@ -0,0 +1,60 @@
+"""谱面预处理 (_strip_storyboard) 的测试，不需要 .NET 运行时"""
+from osu_tools.calculator import _strip_storyboard
+
+
+def test_strip_storyboard_keeps_breaks():
+    raw = (
+        b'osu file format v14\n'
+        b'[Events]\n'
+        b'//Background and Video events\n'
+        b'0,0,"bg.jpg",0,0\n'
+        b'2,1000,2000\n'
+        b'Sprite,Foreground,Centre,"a.png",320,240\n'
+        b' F,0,0,100,1,0\n'
+        b'Break,3000,4000\n'
+        b'[TimingPoints]\n'
+        b'0,500,4,2,0,100,1,0\n'
+    )
+    assert _strip_storyboard(raw) == (
+        b'osu file format v14\n'
+        b'[Events]\n'
+        b'2,1000,2000\n'
+        b'Break,3000,4000\n'
+        b'[TimingPoints]\n'
+        b'0,500,4,2,0,100,1,0\n'
+    )
+
+
+def test_strip_storyboard_events_last_section():
+    raw = b'[General]\nMode: 0\n[Events]\n0,0,"bg.jpg",0,0\n2,100,200\n'
+    assert _strip_storyboard(raw) == b'[General]\nMode: 0\n[Events]\n2,100,200\n'
+
+
+def test_strip_storyboard_without_events():
+    raw = b'[General]\nMode: 0\n[HitObjects]\n256,192,0,1,0\n'
+    assert _strip_storyboard(raw) is raw
+
+
+def test_strip_storyboard_crlf():
+    raw = (
+        b'osu file format v14\r\n'
+        b'[Events]\r\n'
+        b'0,0,"bg.jpg",0,0\r\n'
+        b'Break,3000,4000\r\n'
+        b'\r\n'
+        b'[TimingPoints]\r\n'
+        b'0,500,4,2,0,100,1,0\r\n'
+    )
+    # 行尾保持 \r\n，不会留下孤立的 \n
+    assert _strip_storyboard(raw) == (
+        b'osu file format v14\r\n'
+        b'[Events]\r\n'
+        b'Break,3000,4000\r\n'
+        b'[TimingPoints]\r\n'
+        b'0,500,4,2,0,100,1,0\r\n'
+    )
+
+
+def test_strip_storyboard_empty_events():
+    raw = b'[General]\nMode: 0\n[Events]\n[HitObjects]\n256,192,0,1,0\n'
+    assert _strip_storyboard(raw) == raw